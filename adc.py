@@ -1,11 +1,13 @@
 import machine
+import micropython
+from micropython import const
 
 # Initialize ADC on GP28 (ADC2)
 adc = machine.ADC(28)
 
 #Calibrated Values
-RAW_MIN = 600      # Dark
-RAW_MAX = 65338    # Flashlight
+RAW_MIN = const(600)     # Dark
+RAW_MAX = const(65338)   # Flashlight
 
 def read_sensor_raw() -> int:
     """
@@ -14,19 +16,22 @@ def read_sensor_raw() -> int:
     """
     return adc.read_u16()
 
-def normalize_raw(raw: int, min_in: RAW_MIN, max_in: RAW_MAX) -> float:
+# Precomputed so normalize_raw multiplies instead of dividing
+_INV_SPAN = 1.0 / (RAW_MAX - RAW_MIN)
+
+@micropython.native
+def normalize_raw(raw: int) -> float:
     """
     Normalize raw ADC value to a float in [0.0, 1.0].
     Returns: float in [0.0, 1.0]
     """
-    if raw < min_in:
-        raw = min_in
-    elif raw > max_in:
-        raw = max_in
-    return (raw - min_in) / (max_in - min_in)
+    if raw < RAW_MIN:
+        return 0.0
+    if raw > RAW_MAX:
+        return 1.0
+    return (raw - RAW_MIN) * _INV_SPAN
 
+@micropython.native
 def estimate_lux(norm: float) -> float:
     """Rough estimate of lux  from normalized value."""
     return norm * 1000
-
-
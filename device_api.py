@@ -1,18 +1,35 @@
 import gc, utime
 from adc import read_sensor_raw, normalize_raw, estimate_lux #function names can be changed
 
+# Payload dicts are allocated once and updated in place on every request.
+# They are shared, not re-entrant: serialize the result before the next call.
+_SENSOR = {"raw": 0, "norm": 0.0, "lux": 0.0}
+_HEALTH = {"device_id": "", "uptime_ms": 0, "heap_free": 0, "sensor": _SENSOR}
+
+_HEAP_REFRESH_MS = 1000
+_heap_ticks = utime.ticks_add(utime.ticks_ms(), -_HEAP_REFRESH_MS)
+
 def sensor_payload() -> dict:
-    """Build /sensor response body."""
+    """Build /sensor response body (shared dict, see above)."""
     raw = read_sensor_raw()
     norm = normalize_raw(raw)
-    lux = estimate_lux(norm)
-    return {"raw": raw, "norm": norm, "lux": lux}
+    _SENSOR["raw"] = raw
+    _SENSOR["norm"] = norm
+    _SENSOR["lux"] = estimate_lux(norm)
+    return _SENSOR
 
-def health_payload(device_id: str = "pico-w-unknown") -> dict:
-    """Health & sensor payloads."""
-    return {
-        "device_id": device_id,
-        "uptime_ms": utime.ticks_ms(),
-        "heap_free": gc.mem_free(),
-        "sensor": sensor_payload()
-    }
\ No newline at end of file
+def health_payload(device_id: str = "pico-w-unknown", full: bool = False) -> dict:
+    """
+    Health & sensor payloads (shared dict, see above).
+    gc.mem_free() walks the heap, so heap_free is refreshed at most every
+    _HEAP_REFRESH_MS unless full=True asks for a fresh value.
+    """
+    global _heap_ticks
+    now = utime.ticks_ms()
+    if full or utime.ticks_diff(now, _heap_ticks) >= _HEAP_REFRESH_MS:
+        _HEALTH["heap_free"] = gc.mem_free()
+        _heap_ticks = now
+    _HEALTH["device_id"] = device_id
+    _HEALTH["uptime_ms"] = now
+    sensor_payload()
+    return _HEALTH
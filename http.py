@@ -1,14 +1,19 @@
 import ujson
+from array import array
 import uasyncio as asyncio
+import config
 
-from device_api import (
-    sensor_payload,
-    health_payload,
+from device_api import sensor_payload, health_payload
+from playback import (
     play_tone_for_ms,
     play_melody,
-    cancel_playback,
+    cancel_current_playback as cancel_playback,
 )
 
+_READ_SIZE = 512
+_MAX_HEAD = 2048
+_IDLE_MS = 5000  # close connections that send nothing for this long
+
 _STATUS_TEXT = {
     200: "OK",
     202: "Accepted",
@@ -20,131 +25,269 @@ _STATUS_TEXT = {
     500: "Internal Server Error",
 }
 
-async def send_json(writer, status: int, obj: dict):
-    """Serialize obj to JSON and send an HTTP response."""
+def _header_prefix(status: int, reason: str, keep_alive: bool = False) -> bytes:
+    """Response headers up to (but not including) the Content-Length value."""
+    return (
+        "HTTP/1.1 %d %s\r\n"
+        "Content-Type: application/json\r\n"
+        "Connection: %s\r\n"
+        "Content-Length: " % (status, reason, "keep-alive" if keep_alive else "close")
+    ).encode()
+
+# Everything but Content-Length is fixed per status, so build it once.
+# Indexed by keep_alive first: _HDR_PREFIX[keep_alive][status]
+_HDR_PREFIX = tuple(
+    {status: _header_prefix(status, reason, ka) for status, reason in _STATUS_TEXT.items()}
+    for ka in (False, True)
+)
+
+def _build_response(status: int, obj: dict, keep_alive: bool = False) -> bytes:
+    """Serialize obj to JSON and return the complete HTTP response."""
     try:
-        body = ujson.dumps(obj).encode("utf-8")
+        body = ujson.dumps(obj).encode()
     except Exception:
         status = 500
         body = b'{"error":"serialization"}'
 
-    reason = _STATUS_TEXT.get(status, "OK")
-    headers = (
-        f"HTTP/1.1 {status} {reason}\r\n"
-        "Content-Type: application/json\r\n"
-        f"Content-Length: {len(body)}\r\n"
-        "Connection: close\r\n"
-        "\r\n"
-    ).encode("utf-8")
+    prefix = _HDR_PREFIX[keep_alive].get(status)
+    if prefix is None:
+        prefix = _header_prefix(status, "OK", keep_alive)
+    return prefix + b"%d\r\n\r\n" % len(body) + body
+
+def _build_fixed(status: int, obj: dict) -> tuple:
+    """Prebuild a response in both Connection variants, indexed by keep_alive."""
+    return (_build_response(status, obj, False), _build_response(status, obj, True))
 
-    writer.write(headers + body)
+# Fixed responses are serialized once at import time
+_RESP_BAD_REQUEST = _build_fixed(400, {"error": "Bad Request"})
+_RESP_INVALID_JSON = _build_fixed(400, {"error": "Invalid JSON"})
+_RESP_NOT_FOUND = _build_fixed(404, {"error": "Not Found"})
+_RESP_NOT_ALLOWED = _build_fixed(405, {"error": "Method Not Allowed"})
+_RESP_CANCELED = _build_fixed(202, {"status": "canceled"})
+
+async def send_raw(writer, buf: bytes):
+    """Send a prebuilt HTTP response."""
+    # Single write so headers and body go out together
+    writer.write(buf)
     if hasattr(writer, "drain"):
         await writer.drain()
 
+async def send_json(writer, status: int, obj: dict, keep_alive: bool = False):
+    """Serialize obj to JSON and send an HTTP response."""
+    await send_raw(writer, _build_response(status, obj, keep_alive))
+
 
-async def handle_get_sensor(writer):
+async def handle_get_sensor(writer, keep_alive: bool = False):
     data = sensor_payload()
-    await send_json(writer, 200, data)
+    await send_json(writer, 200, data, keep_alive)
 
-async def handle_get_health(writer):
-    data = health_payload()
-    await send_json(writer, 200, data)
+async def handle_get_health(writer, keep_alive: bool = False, query: str = ""):
+    # ?full=1 forces a fresh heap_free reading
+    data = health_payload(full="full=1" in query.split("&"))
+    await send_json(writer, 200, data, keep_alive)
 
-async def handle_post_tone(body: dict, writer):
+async def handle_post_tone(body: dict, writer, keep_alive: bool = False):
     try:
         freq = int(body.get("freq"))
         ms = int(body.get("ms", 250))
         duty = float(body.get("duty", 0.5))
     except Exception:
-        await send_json(writer, 400, {"error": "Invalid tone parameters"})
+        await send_json(writer, 400, {"error": "Invalid tone parameters"}, keep_alive)
         return
 
-    await play_tone_for_ms(freq=freq, ms=ms, duty=duty)
-    await send_json(writer, 202, {"status": "tone played", "freq": freq, "ms": ms, "duty": duty})
+    play_tone_for_ms(freq=freq, ms=ms, duty=duty)
+    await send_json(
+        writer, 202, {"status": "tone played", "freq": freq, "ms": ms, "duty": duty}, keep_alive
+    )
+
+_MELODY_SCHEMA = 'notes must be [[freq, ms], ...] or [{"freq": f, "ms": ms}, ...]'
 
-async def handle_post_melody(body: dict, writer):
+async def handle_post_melody(body: dict, writer, keep_alive: bool = False):
     try:
         notes = body.get("notes", [])
         gap_ms = int(body.get("gap_ms", 50))
         duty = float(body.get("duty", 0.5))
-        if not isinstance(notes, list) or any(
-            not isinstance(n, (list, tuple)) or len(n) != 2 for n in notes
-        ):
-            raise ValueError("notes must be [[freq, ms], ...]")
+        if not isinstance(notes, list):
+            raise ValueError(_MELODY_SCHEMA)
+        if not 0 <= gap_ms <= config.MAX_MS:
+            raise ValueError("gap_ms out of range")
+        # Pick (and shape-check) the note schema once from the first note
+        # instead of per note
+        if notes and isinstance(notes[0], dict):
+            f_key, ms_key = "freq", "ms"
+        elif not notes or (isinstance(notes[0], (list, tuple)) and len(notes[0]) == 2):
+            f_key, ms_key = 0, 1
+        else:
+            raise ValueError(_MELODY_SCHEMA)
+        # Validate every value before packing: array('H') silently wraps
+        # out-of-range values on MicroPython instead of raising. A note that
+        # doesn't match the chosen schema fails on indexing or int() here.
+        freqs = array("H")
+        durs = array("H")
+        for n in notes:
+            try:
+                freq = int(n[f_key])
+                ms = int(n[ms_key])
+            except (TypeError, KeyError, IndexError, ValueError):
+                raise ValueError(_MELODY_SCHEMA)
+            # freq 0 is a rest (start_tone treats it as silence)
+            if freq and not config.MIN_FREQ <= freq <= config.MAX_FREQ:
+                raise ValueError("freq out of range")
+            if not config.MIN_MS <= ms <= config.MAX_MS:
+                raise ValueError("ms out of range")
+            freqs.append(freq)
+            durs.append(ms)
     except Exception as e:
-        await send_json(writer, 400, {"error": "Invalid melody payload", "detail": str(e)})
+        await send_json(
+            writer, 400, {"error": "Invalid melody payload", "detail": str(e)}, keep_alive
+        )
         return
 
-    await play_melody(notes, gap_ms=gap_ms, duty=duty)
-    await send_json(writer, 202, {"status": "melody played", "length": len(notes), "gap_ms": gap_ms, "duty": duty})
+    play_melody(freqs, durs, gap_ms=gap_ms, duty=duty)
+    await send_json(
+        writer,
+        202,
+        {"status": "melody played", "length": len(freqs), "gap_ms": gap_ms, "duty": duty},
+        keep_alive,
+    )
 
-async def handle_post_cancel(writer):
+async def handle_post_cancel(writer, keep_alive: bool = False):
     try:
         cancel_playback()
-        await send_json(writer, 202, {"status": "canceled"})
+        await send_raw(writer, _RESP_CANCELED[keep_alive])
     except Exception as e:
-        await send_json(writer, 500, {"error": "internal", "detail": str(e)})
+        await send_json(writer, 500, {"error": "internal", "detail": str(e)}, keep_alive)
 
 
-async def handle_client(reader, writer):
-    try:
-        req_line = await reader.readline()
-        if not req_line:
-            try:
-                await writer.aclose()
-            except AttributeError:
-                writer.close()
-            return
-
-        parts = req_line.decode().strip().split()
-        if len(parts) < 2:
-            await send_json(writer, 400, {"error": "Bad Request"})
-            return
-        method, path = parts[0], parts[1]
-
-        headers = {}
-        while True:
-            line = await reader.readline()
-            if not line or line in (b"\r\n", b"\n"):
-                break
-            kv = line.decode().split(":", 1)
-            if len(kv) == 2:
-                headers[kv[0].strip().lower()] = kv[1].strip()
-
-        if method == "GET":
-            if path == "/sensor":
-                await handle_get_sensor(writer)
-            elif path == "/health":
-                await handle_get_health(writer)
-            else:
-                await send_json(writer, 404, {"error": "Not Found"})
+async def read_head(reader, buf: bytes = b""):
+    """
+    Read until the blank line that ends the request headers.
+    buf holds bytes already received for this request (pipelining).
+    Gives up if any read waits longer than _IDLE_MS.
+    Returns (buf, idx) where idx is the offset of b"\r\n\r\n" in buf,
+    or -1 if the peer closed early, stalled, or the headers are too large.
+    """
+    start = 0
+    while True:
+        idx = buf.find(b"\r\n\r\n", start)
+        if idx >= 0:
+            return buf, idx
+        if len(buf) > _MAX_HEAD:
+            return buf, -1
+        try:
+            chunk = await asyncio.wait_for_ms(reader.read(_READ_SIZE), _IDLE_MS)
+        except asyncio.TimeoutError:
+            return buf, -1
+        if not chunk:
+            return buf, -1
+        # Only rescan the tail in case the terminator straddles two chunks
+        start = len(buf) - 3 if len(buf) > 3 else 0
+        buf += chunk
+
+
+def wants_keep_alive(version: bytes, headers: dict) -> bool:
+    """HTTP/1.1 is persistent unless the client says close; HTTP/1.0 must opt in."""
+    conn = headers.get(b"connection", b"").lower()
+    if version == b"HTTP/1.1":
+        return conn != b"close"
+    return conn == b"keep-alive"
+
+
+async def handle_request(reader, writer, buf: bytes = b""):
+    """
+    Read and answer a single request.
+    buf holds bytes left over from the previous request on this connection.
+    Returns the bytes received past this request if the connection should
+    stay open for another one, or None to close it.
+    """
+    buf, idx = await read_head(reader, buf)
+    if not buf:
+        return None
+    if idx < 0:
+        await send_raw(writer, _RESP_BAD_REQUEST[False])
+        return None
 
-        elif method == "POST":
-            clen = int(headers.get("content-length", "0") or "0")
-            body_bytes = b""
-            while len(body_bytes) < clen:
-                chunk = await reader.read(clen - len(body_bytes))
-                if not chunk:
-                    break
-                body_bytes += chunk
+    lines = buf[:idx].split(b"\r\n")
+    parts = lines[0].split()
+    if len(parts) < 2:
+        await send_raw(writer, _RESP_BAD_REQUEST[False])
+        return None
+    method, path = str(parts[0], "utf-8"), str(parts[1], "utf-8")
+    query = ""
+    q = path.find("?")
+    if q >= 0:
+        path, query = path[:q], path[q + 1:]
 
+    # Header names/values stay as bytes; only the ones we use are looked at
+    headers = {}
+    for line in lines[1:]:
+        sep = line.find(b":")
+        if sep > 0:
+            headers[line[:sep].strip().lower()] = line[sep + 1:].strip()
+
+    keep_alive = wants_keep_alive(parts[2] if len(parts) > 2 else b"HTTP/1.0", headers)
+    end = idx + 4
+
+    if method == "GET":
+        if path == "/sensor":
+            await handle_get_sensor(writer, keep_alive)
+        elif path == "/health":
+            await handle_get_health(writer, keep_alive, query)
+        else:
+            await send_raw(writer, _RESP_NOT_FOUND[keep_alive])
+
+    elif method == "POST":
+        try:
+            clen = int(headers.get(b"content-length", b"0") or b"0")
+        except ValueError:
+            clen = -1
+        if clen < 0:
+            await send_raw(writer, _RESP_BAD_REQUEST[False])
+            return None
+        # Any body bytes that arrived along with the headers count toward clen
+        body_bytes = buf[end:end + clen]
+        end += clen
+        if len(body_bytes) < clen:
+            # Fetch the rest in one call instead of growing body_bytes per chunk
             try:
-                body = ujson.loads(body_bytes) if body_bytes else {}
-            except Exception:
-                await send_json(writer, 400, {"error": "Invalid JSON"})
-                return
-
-            if path == "/tone":
-                await handle_post_tone(body, writer)
-            elif path == "/melody":
-                await handle_post_melody(body, writer)
-            elif path == "/cancel":
-                await handle_post_cancel(writer)
-            else:
-                await send_json(writer, 404, {"error": "Not Found"})
+                body_bytes += await asyncio.wait_for_ms(
+                    reader.readexactly(clen - len(body_bytes)), _IDLE_MS
+                )
+            except (EOFError, asyncio.TimeoutError):
+                await send_raw(writer, _RESP_BAD_REQUEST[False])
+                return None
 
+        try:
+            body = ujson.loads(body_bytes) if body_bytes else {}
+        except Exception:
+            await send_raw(writer, _RESP_INVALID_JSON[keep_alive])
+            return buf[end:] if keep_alive else None
+
+        if path == "/tone":
+            await handle_post_tone(body, writer, keep_alive)
+        elif path == "/melody":
+            await handle_post_melody(body, writer, keep_alive)
+        elif path == "/cancel":
+            await handle_post_cancel(writer, keep_alive)
         else:
-            await send_json(writer, 405, {"error": "Method Not Allowed"})
+            await send_raw(writer, _RESP_NOT_FOUND[keep_alive])
+
+    else:
+        # The body (if any) was not consumed, so the stream can't be reused
+        await send_raw(writer, _RESP_NOT_ALLOWED[False])
+        return None
+
+    # Anything past this request is the start of the next (pipelined) one
+    return buf[end:] if keep_alive else None
+
+
+async def handle_client(reader, writer):
+    try:
+        # Serve requests on this connection until the client asks to close
+        # or goes quiet; responses are drained before the next request is read
+        buf = await handle_request(reader, writer)
+        while buf is not None:
+            buf = await handle_request(reader, writer, buf)
 
     except Exception as e:
         try:
@@ -1,49 +1,103 @@
 import uasyncio as asyncio
+import utime
 import config
 from buzzer import start_tone, stop_tone #function names can be changed
 
-_current_task = None
+# How often a playing note checks whether it has been replaced or canceled
+_TICK_MS = 10
 
-async def _play_note_async(freq: int, ms: int, duty: float) -> None:
+_TONE = 0
+_MELODY = 1
+
+# A single long-lived worker plays commands; callers just replace _cmd and
+# wake it. _gen is bumped on every new command or cancel so the note that
+# is currently playing notices it has been superseded.
+_cmd = None
+_gen = 0
+_wake = asyncio.ThreadSafeFlag()
+_worker_task = None
+
+async def _sleep_until_unless_superseded(deadline: int, gen: int) -> bool:
+    """
+    Sleep in short slices until the utime.ticks_ms() deadline.
+    Returns False as soon as a newer command arrives.
+    """
+    while gen == _gen:
+        left = utime.ticks_diff(deadline, utime.ticks_ms())
+        if left <= 0:
+            return True
+        await asyncio.sleep_ms(left if left < _TICK_MS else _TICK_MS)
+    return False
+
+async def _play_note_async(freq: int, ms: int, duty: float, gen: int) -> None:
     """High-level playback (async)."""
-    try:
-        start_tone(freq, duty)
-        await asyncio.sleep_ms(ms)
-    finally:
+    start_tone(freq, duty)
+    await _sleep_until_unless_superseded(utime.ticks_add(utime.ticks_ms(), ms), gen)
+
+async def _play_melody_async(freqs, durs, gap_ms: int, duty: float, gen: int):
+    """
+    Coroutine that plays a melody sequentially.
+    Note boundaries are absolute offsets from the melody start, so scheduling
+    overshoot on one note does not push back every note after it.
+    """
+    t = utime.ticks_ms()
+    for i in range(len(freqs)):
+        start_tone(freqs[i], duty)
+        t = utime.ticks_add(t, durs[i])
+        if not await _sleep_until_unless_superseded(t, gen):
+            return
         stop_tone()
+        t = utime.ticks_add(t, gap_ms)
+        if not await _sleep_until_unless_superseded(t, gen):
+            return
+
+async def _worker() -> None:
+    """Play the latest command whenever woken; runs for the life of the program."""
+    global _cmd
+    while True:
+        await _wake.wait()
+        cmd = _cmd
+        _cmd = None
+        if cmd is None:
+            continue
+        gen = _gen
+        try:
+            if cmd[0] == _TONE:
+                await _play_note_async(cmd[1], cmd[2], cmd[3], gen)
+            else:
+                await _play_melody_async(cmd[1], cmd[2], cmd[3], cmd[4], gen)
+        except Exception:
+            # Keep the worker alive for the next command
+            pass
+        finally:
+            stop_tone()
+
+def _submit(cmd: tuple) -> None:
+    """Replace whatever is playing with cmd and wake the worker."""
+    global _cmd, _gen, _worker_task
+    if _worker_task is None:
+        _worker_task = asyncio.create_task(_worker())
+    _gen += 1
+    _cmd = cmd
+    _wake.set()
 
 def cancel_current_playback() -> None:
-    """Cancel currently scheduled/playing task."""
-    global _current_task
-    if _current_task and not _current_task.done():
-        _current_task.cancel()
-        stop_tone()
-    _current_task = None
-    
+    """Cancel currently scheduled/playing command."""
+    global _cmd, _gen
+    _cmd = None
+    _gen += 1
+    stop_tone()
+
 def play_tone_for_ms(freq: int, ms: int, duty: float = config.DEFAULT_DUTY) -> None:
     """Schedule immediate tone (non-blocking). Cancels any existing."""
-    global _current_task
-    cancel_current_playback()
-    _current_task = asyncio.create_task(_play_note_async(freq, ms, duty))
-
-async def _play_melody_async(notes: list, gap_ms: int, duty: float):
-    """Coroutine that plays a melody sequentially."""
-    try:
-        for note in notes:
-            if isinstance(note, (list, tuple)):
-                freq, ms = note
-            else:
-                freq, ms = note["freq"], note["ms"]
-            start_tone(freq, duty)
-            await asyncio.sleep_ms(ms)
-            stop_tone()
-            await asyncio.sleep_ms(gap_ms)
-    finally:
-        stop_tone()
+    _submit((_TONE, freq, ms, duty))
 
-def play_melody(notes: list, gap_ms: int = config.DEFAULT_GAP_MS, duty: float = config.DEFAULT_DUTY) -> int:
-    """Cancel current and queue a melody. Returns count queued."""
-    global _current_task
-    cancel_current_playback()
-    _current_task = asyncio.create_task(_play_melody_async(notes, gap_ms, duty))
-    return len(notes)
\ No newline at end of file
+def play_melody(
+    freqs, durs, gap_ms: int = config.DEFAULT_GAP_MS, duty: float = config.DEFAULT_DUTY
+) -> int:
+    """
+    Cancel current and queue a melody. Returns count queued.
+    freqs and durs are parallel sequences (e.g. array('H')) of Hz and ms.
+    """
+    _submit((_MELODY, freqs, durs, gap_ms, duty))
+    return len(freqs)
@@ -1,12 +1,23 @@
 # conductor.py
 # To be run on a student's computer (not the Pico)
-# Requires the 'requests' library: pip install requests.
+# Requires the 'aiohttp' library: pip install aiohttp.
+# 'orjson' is used for faster JSON encoding when installed.
 
-from typing import List, Dict, Optional
-import requests
-import time
+from typing import List, Dict, Optional, Set
+import asyncio
+import contextlib
+import functools
+import aiohttp
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import sys
+
+try:
+    from orjson import dumps as json_dumps
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    import json
+
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
 
 # --- Configuration ---
 # Students should populate this list with the IP address(es of their Picos
@@ -14,6 +25,18 @@ PICO_IPS = [
     "192.168.137.245",
 ]
 
+CT_JSON = {"Content-Type": "application/json"}
+
+# Per-device timeout for fire-and-forget /tone broadcasts (seconds)
+NOTE_TIMEOUT = 1.0
+
+# play_note_on_all broadcasts that have not completed yet
+_pending_notes: Set["asyncio.Future"] = set()
+
+# Per-device timeout for /melody and /cancel (seconds); leaves room for the
+# first TCP connect to a Pico over Wi-Fi, since a miss costs the whole song
+MELODY_TIMEOUT = 2.0
+
 logger = logging.getLogger("conductor")
 if not logger.handlers:
     handler = logging.StreamHandler()
@@ -81,53 +104,154 @@ def load_picos(path: Optional[str] = None) -> List[str]:
     return ips
 
 
-def send_post(ip: str, path: str, payload: Dict, timeout: float = 0.2) -> requests.Response:
+def make_session() -> aiohttp.ClientSession:
+    """
+    Output:
+      - aiohttp.ClientSession shared by all requests of a run
+    Notes:
+      - Must be called from inside a running event loop
+      - Pools and keeps connections alive so notes reuse the same TCP sockets
+    """
+    connector = aiohttp.TCPConnector(limit=64, keepalive_timeout=30)
+    return aiohttp.ClientSession(connector=connector)
+
+
+@contextlib.asynccontextmanager
+async def open_session():
+    """
+    Output:
+      - async context manager yielding a make_session() session
+    Side-effects:
+      - Waits for in-flight play_note_on_all broadcasts before the session closes
+    """
+    async with make_session() as session:
+        try:
+            yield session
+        finally:
+            await flush_notes()
+
+
+async def send_post(
+    session: aiohttp.ClientSession,
+    ip: str,
+    path: str,
+    payload,
+    timeout: float = 0.2,
+) -> int:
     """
     Input:
+      - session: shared aiohttp.ClientSession
       - ip: "192.168.1.101" or "host:port"
       - path: API path, e.g. "/tone" or "/melody"
-      - payload: dict representing JSON body
+      - payload: dict representing JSON body, or already-encoded JSON bytes
       - timeout: float seconds
     Output:
-      - requests.Response object (may raise RequestException on errors)
+      - HTTP status code (may raise aiohttp.ClientError / asyncio.TimeoutError)
     Side-effects:
       - Network: a JSON POST to http://{ip}{path}.
       - Ensures path starts with '/'.
-      - May raise requests.RequestException on network errors.
     """
     if not path.startswith("/"):
         path = "/" + path
     url = f"http://{ip}{path}"
-    logger.debug("POST %s payload=%s timeout=%s", url, payload, timeout)
-    resp = requests.post(url, json=payload, timeout=timeout)
-    logger.debug("Response %s: %s", url, resp.status_code)
-    return resp
+    body = payload if isinstance(payload, bytes) else json_dumps(payload)
+    logger.debug("POST %s payload=%s timeout=%s", url, body, timeout)
+    async with session.post(
+        url, data=body, headers=CT_JSON, timeout=aiohttp.ClientTimeout(total=timeout)
+    ) as resp:
+        # Read the body so the connection goes back to the pool
+        await resp.read()
+        logger.debug("Response %s: %s", url, resp.status)
+        return resp.status
 
 
-def play_note_on_all(freq, ms):
-    """Sends a /tone POST request to every Pico in the list."""
-    print(f"Playing note: {freq}Hz for {ms}ms on all devices.")
+async def broadcast_post(
+    session: aiohttp.ClientSession,
+    picos: List[str],
+    path: str,
+    payload: Dict,
+    timeout: float = 0.2,
+) -> List:
+    """
+    Input:
+      - session: shared aiohttp.ClientSession
+      - picos: list of Pico IPs
+      - path: API path
+      - payload: dict representing JSON body
+      - timeout: per-request timeout in seconds
+    Output:
+      - list with one entry per Pico: status code or the raised exception
+    Side-effects:
+      - POSTs to every Pico concurrently; the body is encoded only once
+    """
+    body = json_dumps(payload)
+    return await asyncio.gather(
+        *(send_post(session, ip, path, body, timeout) for ip in picos),
+        return_exceptions=True,
+    )
+
 
-    payload = {"freq": freq, "ms": ms, "duty": 0.5}
+def _report_note(picos: List[str], task: "asyncio.Future") -> None:
+    """Done-callback for play_note_on_all: drop the task and log per-device failures."""
+    _pending_notes.discard(task)
+    if not task.cancelled():
+        log_broadcast_errors(picos, "/tone", task.result())
 
-    for ip in PICO_IPS:
-        url = f"http://{ip}/tone"
-        try:
-            # We use a short timeout because we don't need to wait for a response
-            # This makes the orchestra play more in sync.
-            requests.post(url, json=payload, timeout=0.1)
-        except requests.exceptions.Timeout:
-            # This is expected, we can ignore it
-            pass
-        except requests.exceptions.RequestException as e:
-            print(f"Error contacting {ip}: {e}")  
 
+def play_note_on_all(
+    session: aiohttp.ClientSession,
+    picos: List[str],
+    freq: int,
+    ms: int,
+    duty: float = 0.5,
+) -> "asyncio.Future":
+    """
+    Sends a /tone POST request to every Pico concurrently, without waiting.
 
-def play_note_on_pico(ip: str, freq: int, ms: int, duty: float = 0.5) -> None:
+    Input:
+      - session: shared aiohttp.ClientSession (from open_session())
+      - picos: list of Pico IPs
+      - freq: frequency in Hz
+      - ms: duration in milliseconds
+      - duty: duty cycle (volume) 0.0-1.0
+    Output:
+      - the scheduled broadcast; its result is the per-device gather output
+    Side-effects:
+      - Schedules POST /tone to every Pico on the running event loop
+      - Per-device failures are logged when the broadcast completes
+    Notes:
+      - Returns immediately, so a slow or unreachable Pico never holds up
+        the next note
+      - open_session() waits for in-flight broadcasts before closing the
+        session; with a session from make_session(), await flush_notes() first
+    """
+    logger.debug("Playing note: %dHz for %dms on all devices.", freq, ms)
+
+    payload = {"freq": int(freq), "ms": int(ms), "duty": float(duty)}
+
+    task = asyncio.ensure_future(
+        broadcast_post(session, picos, "/tone", payload, timeout=NOTE_TIMEOUT)
+    )
+    # Keep a reference so the task isn't garbage collected while in flight
+    _pending_notes.add(task)
+    task.add_done_callback(functools.partial(_report_note, picos))
+    return task
+
+
+async def flush_notes() -> None:
+    """Wait for all in-flight play_note_on_all broadcasts."""
+    if _pending_notes:
+        await asyncio.gather(*list(_pending_notes), return_exceptions=True)
+
+
+async def play_note_on_pico(
+    session: aiohttp.ClientSession, ip: str, freq: int, ms: int, duty: float = 0.5
+) -> None:
     """
     Sends POST /tone to a single Pico. Best-effort: swallow network errors.
-    
+
     Input:
+      - session: shared aiohttp.ClientSession
       - ip: Pico IP address
       - freq: frequency in Hz
       - ms: duration in milliseconds
@@ -141,62 +265,96 @@ def play_note_on_pico(ip: str, freq: int, ms: int, duty: float = 0.5) -> None:
     """
     payload = {"freq": int(freq), "ms": int(ms), "duty": float(duty)}
     try:
-        send_post(ip, "/tone", payload, timeout=0.15)
+        await send_post(session, ip, "/tone", payload, timeout=0.15)
         logger.debug("Sent /tone to %s payload=%s", ip, payload)
-    except requests.RequestException as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         logger.warning("play_note_on_pico: %s error: %s", ip, e)
 
 
-def play_melody_on_all(picos: List[str], notes: List[Dict], gap_ms: int = 20) -> None:
+def log_broadcast_errors(picos: List[str], path: str, results: List) -> List[str]:
+    """
+    Input:
+      - picos: list of Pico IPs, in the order they were broadcast to
+      - path: API path that was posted, for the log message
+      - results: broadcast_post() output for the same picos
+    Output:
+      - list of Pico IPs that accepted the request
+    Side-effects:
+      - Logs a warning for each device that failed or returned an error status
+    """
+    ok: List[str] = []
+    for ip, res in zip(picos, results):
+        if isinstance(res, BaseException):
+            logger.warning("POST %s to %s failed: %r", path, ip, res)
+        elif res >= 400:
+            logger.warning("POST %s to %s returned HTTP %s", path, ip, res)
+        else:
+            ok.append(ip)
+    return ok
+
+
+async def play_melody_on_all(
+    session: aiohttp.ClientSession,
+    picos: List[str],
+    notes: List[Dict],
+    gap_ms: int = 20,
+    duty: float = 0.5,
+) -> List[str]:
     """
     Broadcast a queued melody to all Picos concurrently.
-    Expects notes like: [{"freq":440, "ms":300, "duty":0.5}, ...]
+    Expects notes like: [{"freq":440, "ms":300}, ...]
 
     Input:
+      - session: shared aiohttp.ClientSession
       - picos: list of Pico IPs
-      - notes: list of {"freq":int,"ms":int,"duty"?:float}
+      - notes: list of {"freq":int,"ms":int}
       - gap_ms: gap between notes in ms
+      - duty: duty cycle (volume) 0.0-1.0 for the whole melody
     Output:
-      - None
+      - list of Pico IPs that accepted the melody
     Side-effects:
       - Sends POST /melody to each Pico
+      - Logs a warning for each Pico that did not accept it
+    Notes:
+      - The Pico's /melody takes notes as [[freq, ms], ...] with one duty
     """
     if not picos:
         logger.debug("play_melody_on_all: empty pico list")
-        return
+        return []
     if not notes:
         logger.debug("play_melody_on_all: empty notes list")
-        return
+        return []
 
-    # Normalize and filter notes
-    norm_notes: List[Dict] = []
-    for n in notes:
-        if "freq" in n and "ms" in n:
-            norm_notes.append({
-                "freq": int(n["freq"]),
-                "ms": int(n["ms"]),
-                "duty": float(n.get("duty", 0.5)),
-            })
+    # Normalize and filter notes into the wire format
+    norm_notes = [[int(n["freq"]), int(n["ms"])] for n in notes if "freq" in n and "ms" in n]
     if not norm_notes:
         logger.debug("play_melody_on_all: no valid notes after normalization")
-        return
+        return []
 
-    payload = {"notes": norm_notes, "gap_ms": int(gap_ms)}
+    payload = {"notes": norm_notes, "gap_ms": int(gap_ms), "duty": float(duty)}
 
-    def _send(ip: str) -> None:
-        try:
-            send_post(ip, "/melody", payload, timeout=0.2)
-        except requests.RequestException:
-            # Best-effort; ignore per device
-            pass
-
-    max_workers = min(16, max(1, len(picos)))
-    with ThreadPoolExecutor(max_workers=max_workers) as ex:
-        for ip in picos:
-            ex.submit(_send, ip)
+    results = await broadcast_post(session, picos, "/melody", payload, timeout=MELODY_TIMEOUT)
     logger.debug("Broadcast /melody to %d devices payload=%s", len(picos), payload)
+    return log_broadcast_errors(picos, "/melody", results)
+
 
-def conductor_play_song(picos: List[str], song: List[Dict] = SONG, gap_factor: float = 1.1) -> None:
+async def cancel_on_all(session: aiohttp.ClientSession, picos: List[str]) -> None:
+    """
+    Input:
+      - session: shared aiohttp.ClientSession
+      - picos: list of Pico IPs
+    Output:
+      - None
+    Side-effects:
+      - Sends POST /cancel to each Pico concurrently; failures are logged
+    """
+    results = await broadcast_post(session, picos, "/cancel", {}, timeout=MELODY_TIMEOUT)
+    log_broadcast_errors(picos, "/cancel", results)
+
+
+async def conductor_play_song(
+    picos: List[str], song: List[Dict] = SONG, gap_factor: float = 1.1
+) -> None:
     """
     High-level broadcast composition.
     Input:
@@ -204,27 +362,73 @@ def conductor_play_song(picos: List[str], song: List[Dict] = SONG, gap_factor: f
       - song: list of {"freq":int,"ms":int,"duty":float}
       - gap_factor: multiplier to stretch pause between notes
     Output:
-      - None
+      - None, once the song has finished playing on the Picos
     Side-effects:
-      - Iteratively calls play_note_on_all
-      - Sleeps locally to pace the song
+      - Sends the whole song to each Pico in one /melody POST
+      - Waits for the song's length locally
+      - Sends /cancel to every Pico if interrupted (Ctrl+C or task cancel)
+    Notes:
+      - Each Pico paces the notes itself, so Wi-Fi and host jitter only
+        affect the start of the song, not every note
+      - The gap is gap_factor applied to the average note length
+      - The duty of the first note is used for the whole song
     """
     if not song:
         logger.debug("Empty song passed to conductor_play_song")
         return
     logger.info("Starting song: %d notes across %d devices", len(song), len(picos))
+    avg_ms = sum(int(note["ms"]) for note in song) / len(song)
+    gap_ms = int(avg_ms * max(0.0, float(gap_factor) - 1.0))
+    duty = float(song[0].get("duty", 0.5))
+    song_s = sum(int(note["ms"]) + gap_ms for note in song) / 1000.0
+    async with open_session() as session:
+        try:
+            playing = await play_melody_on_all(session, picos, song, gap_ms=gap_ms, duty=duty)
+            if not playing:
+                logger.warning("No Pico accepted the song")
+                return
+            # The Picos play on their own; wait it out so callers know when it ends
+            await asyncio.sleep(song_s)
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            logger.info("Conductor stopped; canceling playback on all devices.")
+            await cancel_on_all(session, picos)
+            raise
+
+
+def use_uvloop() -> bool:
+    """
+    Output:
+      - True if uvloop's event loop policy was installed
+    Side-effects:
+      - Sets the global asyncio event loop policy
+    Notes:
+      - uvloop is optional and not available on Windows; the default loop is kept then
+    """
+    if sys.platform == "win32":
+        return False
     try:
-        for idx, note in enumerate(song, start=1):
-            freq = int(note["freq"])
-            ms = int(note["ms"])
-            duty = float(note.get("duty", 0.5))
-            logger.info("Note %d/%d: %dHz %dms duty=%s", idx, len(song), freq, ms, duty)
-            play_note_on_all(picos, freq, ms, duty)
-            # Local pacing: stretch the sleep slightly to give devices time to play
-            sleep_s = (ms / 1000.0) * float(gap_factor)
-            time.sleep(max(0.0, sleep_s))
-    except KeyboardInterrupt:
-        logger.info("Conductor stopped by user.")
+        import uvloop
+    except ImportError:
+        logger.debug("uvloop not installed; using the default asyncio loop")
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
+async def main() -> None:
+    # Give a moment for everyone to get ready
+    print("\nStarting in 3...")
+    await asyncio.sleep(1)
+    print("2...")
+    await asyncio.sleep(1)
+    print("1...")
+    await asyncio.sleep(1)
+    print("Go!\n")
+
+    # Play the song
+    await conductor_play_song(load_picos(), SONG)
+
+    print("\nSong finished!")
 
 
 if __name__ == "__main__":
@@ -232,23 +436,9 @@ if __name__ == "__main__":
     print(f"Found {len(PICO_IPS)} devices in the orchestra.")
     print("Press Ctrl+C to stop.")
 
-    try:
-        # Give a moment for everyone to get ready
-        print("\nStarting in 3...")
-        time.sleep(1)
-        print("2...")
-        time.sleep(1)
-        print("1...")
-        time.sleep(1)
-        print("Go!\n")
-
-        # Play the song
-        for note, duration in SONG:
-            play_note_on_all(note, duration)
-            # Wait for the note's duration plus a small gap before playing the next one
-            time.sleep(duration / 1000 * 1.1)
-
-        print("\nSong finished!")
+    use_uvloop()
 
+    try:
+        asyncio.run(main())
     except KeyboardInterrupt:
         print("\nConductor stopped by user.")
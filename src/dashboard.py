@@ -2,9 +2,16 @@
 # To be run on a student's computer (not the Pico)
 
 import requests
+from requests.adapters import HTTPAdapter
 import time
 from typing import Dict, List, Optional
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    from json import loads as json_loads
 
 # --- Configuration ---
 # Students should populate this list with the IP address(es) of their Pico
@@ -12,6 +19,12 @@ PICO_IPS = [
     "192.168.137.245",
 ]
 
+MAX_WORKERS = 32
+
+# One pooled session for all polls so connections are kept alive between refreshes
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS))
+
 
 def fetch_health(ip: str, timeout: float = 1.0) -> Dict:
     """
@@ -25,10 +38,10 @@ def fetch_health(ip: str, timeout: float = 1.0) -> Dict:
     Side-effects:
       - Network GET to http://{ip}/health
     """
-    response = requests.get(f"http://{ip}/health", timeout=timeout)
+    response = _SESSION.get(f"http://{ip}/health", timeout=timeout)
     # This will raise an exception for bad status codes (like 4xx or 5xx)
     response.raise_for_status()
-    return response.json()
+    return json_loads(response.content)
 
 
 def fetch_sensor(ip: str, timeout: float = 1.0) -> Dict:
@@ -43,10 +56,10 @@ def fetch_sensor(ip: str, timeout: float = 1.0) -> Dict:
     Side-effects:
       - Network GET to http://{ip}/sensor
     """
-    response = requests.get(f"http://{ip}/sensor", timeout=timeout)
+    response = _SESSION.get(f"http://{ip}/sensor", timeout=timeout)
     # This will raise an exception for bad status codes
     response.raise_for_status()
-    return response.json()
+    return json_loads(response.content)
 
 
 def get_device_status(ip: str, timeout: float = 1.0) -> Dict:
@@ -64,19 +77,17 @@ def get_device_status(ip: str, timeout: float = 1.0) -> Dict:
         }
       - Should capture network errors and return Offline/Error instead of raising.
     Side-effects:
-      - Calls fetch_health and fetch_sensor.
+      - Calls fetch_health only; /health already embeds the /sensor payload.
     """
     status = {"ip": ip, "device_id": "N/A", "status": "Error", "norm": 0.0}
     try:
-        # Fetch data using the designated functions
         health_data = fetch_health(ip, timeout)
-        sensor_data = fetch_sensor(ip, timeout)
 
-        # Update the status dictionary with data from both fetches
+        # Update the status dictionary; the sensor reading rides along under "sensor"
         status["device_id"] = health_data.get("device_id", "Unknown")
         status["status"] = health_data.get("status", "Unknown")
-        status["norm"] = sensor_data.get("norm", 0.0)
-        
+        status["norm"] = health_data.get("sensor", {}).get("norm", 0.0)
+
     except requests.exceptions.RequestException as e:
         # Catch any network-related errors and set the status accordingly
         status["status"] = f"Offline ({type(e).__name__})"
@@ -95,9 +106,12 @@ def collect_all_statuses(ips: List[str], timeout: float = 0.8) -> List[Dict]:
     Output:
       - list of status dicts, one per IP
     Side-effects:
-      - Calls get_device_status for each IP
+      - Calls get_device_status for each IP concurrently
     """
-    return [get_device_status(ip, timeout=timeout) for ip in ips]
+    if not ips:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(ips))) as ex:
+        return list(ex.map(lambda ip: get_device_status(ip, timeout=timeout), ips))
 
 
 def render_dashboard(statuses: List[Dict]) -> None:
@@ -111,11 +125,14 @@ def render_dashboard(statuses: List[Dict]) -> None:
     Notes:
       - Renders in a simple, human-readable format.
     """
-    print("\033[H\033[J", end="")  # ANSI escape codes to clear the console
-    print("--- Pico Orchestra Dashboard --- (Press Ctrl+C to exit)")
-    print("-" * 60)
-    print(f"{'IP Address':<16} {'Device ID':<25} {'Status':<10} {'Light Level':<20}")
-    print("-" * 60)
+    # Build the whole frame first, then write it in one call
+    lines = [
+        "\033[H\033[J"  # ANSI escape codes to clear the console
+        "--- Pico Orchestra Dashboard --- (Press Ctrl+C to exit)",
+        "-" * 60,
+        f"{'IP Address':<16} {'Device ID':<25} {'Status':<10} {'Light Level':<20}",
+        "-" * 60,
+    ]
 
     for status in statuses:
         # Create a simple bar graph for the light level
@@ -124,14 +141,16 @@ def render_dashboard(statuses: List[Dict]) -> None:
         bar_length = int(max(0, min(light_level * 10, 10)))
         bar = "█" * bar_length + "─" * (10 - bar_length)
 
-        print(
+        lines.append(
             f"{status['ip']:<16} {status['device_id']:<25} {status['status'].capitalize():<10} "
             f"[{bar}] {light_level:.2f}"
         )
 
-    print("-" * 60)
+    lines.append("-" * 60)
     # Add a note about the last refresh time
-    print(f"Last updated: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}")
+    lines.append(f"Last updated: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}")
+    lines.append("")
+    sys.stdout.write("\n".join(lines))
     sys.stdout.flush() # Forces the output to be displayed immediately
 
 